@@ -50,9 +50,12 @@ Output: RGBA PNG where each island has its own local, PCA-aligned gradient.
 from __future__ import annotations
 
 import argparse
+import functools
 import hashlib
 import json
 import math
+import os
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass
 from pathlib import Path
 from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
@@ -60,8 +63,28 @@ from typing import Any, Dict, List, Optional, Sequence, Tuple, Union
 import numpy as np
 from PIL import Image
 
+try:
+    from numba import njit, prange
+except ImportError:  # numba is optional; NumPy fallbacks are used without it.
+    njit = None
+    prange = range
+
+try:
+    from scipy import ndimage, sparse
+    from scipy.sparse.csgraph import connected_components as csgraph_connected_components
+except ImportError:  # scipy is optional; pure-Python fallbacks are used without it.
+    ndimage = None
+    sparse = None
+
 EPS = 1e-8
 
+# Resolution of the cached per-island gradient lookup tables; 8-bit output
+# cannot distinguish more than 256 steps along t.
+GRADIENT_LUT_SIZE = 256
+
+# Minimum islands per worker group before threading the render is worthwhile.
+PARALLEL_MIN_ISLANDS_PER_GROUP = 8
+
 # Nice, clean two-stop HSV palettes:
 # A: lavender -> light blue
 # B: pink -> peach/orange
@@ -97,8 +120,8 @@ def clamp01_array(arr: np.ndarray) -> np.ndarray:
 
 
 def infer_uvs_from_pixels(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
-    u = (pixels[:, 0].astype(np.float64) + 0.5) / max(1, width)
-    v = 1.0 - (pixels[:, 1].astype(np.float64) + 0.5) / max(1, height)
+    u = (pixels[:, 0].astype(np.float32) + np.float32(0.5)) / np.float32(max(1, width))
+    v = np.float32(1.0) - (pixels[:, 1].astype(np.float32) + np.float32(0.5)) / np.float32(max(1, height))
     return np.column_stack((u, v))
 
 
@@ -111,16 +134,33 @@ def compute_principal_axis(points_uv: np.ndarray, eps: float = EPS) -> Optional[
         step = int(math.ceil(sample.shape[0] / 20000.0))
         sample = sample[::step]
 
-    centered = sample - np.mean(sample, axis=0, keepdims=True)
-    cov = centered.T @ centered / max(1, centered.shape[0])
-
-    try:
-        eig_vals, eig_vecs = np.linalg.eigh(cov)
-    except np.linalg.LinAlgError:
-        return None
+    # float64 only here: the covariance subtraction cancels badly in float32.
+    sample = np.asarray(sample, dtype=np.float64)
+
+    # Covariance via the post-hoc formula cov = (X.T @ X) / N - mean mean^T,
+    # avoiding the centered copy of the sample.
+    n = sample.shape[0]
+    mean = np.mean(sample, axis=0)
+    gram = np.dot(sample.T, sample)
+    a = gram[0, 0] / n - mean[0] * mean[0]
+    b = gram[0, 1] / n - mean[0] * mean[1]
+    d = gram[1, 1] / n - mean[1] * mean[1]
+
+    # Closed-form dominant eigenvector of the symmetric 2x2 [[a, b], [b, d]];
+    # no LAPACK dispatch needed at this size.
+    tr = a + d
+    det = a * d - b * b
+    disc = math.sqrt(max(0.0, tr * tr / 4.0 - det))
+    lam = tr / 2.0 + disc
+
+    if abs(b) > eps:
+        axis = np.array([lam - d, b], dtype=np.float64)
+    elif a >= d:
+        axis = np.array([1.0, 0.0], dtype=np.float64)
+    else:
+        axis = np.array([0.0, 1.0], dtype=np.float64)
 
-    axis = eig_vecs[:, int(np.argmax(eig_vals))].astype(np.float64)
-    norm = float(np.linalg.norm(axis))
+    norm = math.hypot(float(axis[0]), float(axis[1]))
     if not np.isfinite(norm) or norm < eps:
         return None
 
@@ -157,7 +197,7 @@ def fallback_t_from_bbox(pixel_uvs: np.ndarray, eps: float = EPS) -> np.ndarray:
     local_uv, span_u, span_v = normalize_local_uv(pixel_uvs, eps=eps)
 
     if span_u < eps and span_v < eps:
-        return np.full(pixel_uvs.shape[0], 0.5, dtype=np.float64)
+        return np.full(pixel_uvs.shape[0], 0.5, dtype=np.float32)
 
     if span_u >= span_v:
         return local_uv[:, 0]
@@ -171,16 +211,25 @@ def compute_local_t(pixel_uvs: np.ndarray, axis_source_uvs: np.ndarray, eps: flo
         return clamp01_array(fallback_t_from_bbox(pixel_uvs, eps=eps))
 
     center = np.mean(axis_source_uvs, axis=0)
-    t_raw = (pixel_uvs - center) @ axis
+    # (uv - center) @ axis == uv @ axis - center @ axis: the projection needs
+    # no N x 2 centered temporary, just two scaled column adds.
+    axis32 = axis.astype(np.float32)
+    t_raw = pixel_uvs[:, 0] * axis32[0] + pixel_uvs[:, 1] * axis32[1]
+    t_raw -= np.float32(center @ axis)
+
     t_min = float(np.min(t_raw))
     t_max = float(np.max(t_raw))
     span = t_max - t_min
     if not np.isfinite(span) or span < eps:
         return clamp01_array(fallback_t_from_bbox(pixel_uvs, eps=eps))
 
-    return clamp01_array((t_raw - t_min) / span)
+    np.subtract(t_raw, t_min, out=t_raw)
+    np.multiply(t_raw, 1.0 / span, out=t_raw)
+    np.clip(t_raw, 0.0, 1.0, out=t_raw)
+    return t_raw
 
 
+@functools.lru_cache(maxsize=4096)
 def palette_for_island(island_id: Union[int, str]) -> Tuple[np.ndarray, np.ndarray]:
     seed = stable_hash64(island_id)
     base_left, base_right = PALETTE_LIBRARY[seed % len(PALETTE_LIBRARY)]
@@ -195,7 +244,7 @@ def palette_for_island(island_id: Union[int, str]) -> Tuple[np.ndarray, np.ndarr
             clamp(base_left[1] + sat_offset, 0.55, 0.75),
             clamp(base_left[2] + val_offset, 0.85, 0.95),
         ],
-        dtype=np.float64,
+        dtype=np.float32,
     )
     right = np.array(
         [
@@ -203,7 +252,7 @@ def palette_for_island(island_id: Union[int, str]) -> Tuple[np.ndarray, np.ndarr
             clamp(base_right[1] + sat_offset, 0.55, 0.75),
             clamp(base_right[2] + val_offset, 0.85, 0.95),
         ],
-        dtype=np.float64,
+        dtype=np.float32,
     )
     return left, right
 
@@ -219,39 +268,62 @@ def lerp_hsv(left_hsv: np.ndarray, right_hsv: np.ndarray, t: np.ndarray) -> np.n
     return np.column_stack((h, s, v))
 
 
+# Per-sector channel sources for HSV->RGB: rows are hue sectors 0..5,
+# columns are (R, G, B), entries index into (c, x, 0).
+HSV_SECTOR_CHANNELS = np.array(
+    [
+        [0, 1, 2],
+        [1, 0, 2],
+        [2, 0, 1],
+        [2, 1, 0],
+        [1, 2, 0],
+        [0, 2, 1],
+    ],
+    dtype=np.uint8,
+)
+
+
 def hsv_to_rgb_np(hsv: np.ndarray) -> np.ndarray:
-    h = hsv[:, 0] % 360.0
-    s = clamp01_array(hsv[:, 1])
-    v = clamp01_array(hsv[:, 2])
+    h = (hsv[:, 0] % 360.0).astype(np.float32)
+    s = clamp01_array(hsv[:, 1]).astype(np.float32)
+    v = clamp01_array(hsv[:, 2]).astype(np.float32)
 
     c = v * s
-    hp = h / 60.0
-    x = c * (1.0 - np.abs((hp % 2.0) - 1.0))
+    hp = h / np.float32(60.0)
+    x = c * (np.float32(1.0) - np.abs((hp % np.float32(2.0)) - np.float32(1.0)))
     m = v - c
 
-    r = np.zeros_like(h)
-    g = np.zeros_like(h)
-    b = np.zeros_like(h)
-
-    conds = [
-        (hp >= 0) & (hp < 1),
-        (hp >= 1) & (hp < 2),
-        (hp >= 2) & (hp < 3),
-        (hp >= 3) & (hp < 4),
-        (hp >= 4) & (hp < 5),
-        (hp >= 5) & (hp < 6),
-    ]
+    sector = np.floor(hp).astype(np.uint8) % 6
+    channels = (c, x, np.zeros_like(c))
+
+    out = np.empty((hsv.shape[0], 3), dtype=np.uint8)
+    for ch in range(3):
+        vals = np.choose(HSV_SECTOR_CHANNELS[sector, ch], channels)
+        vals += m
+        vals *= np.float32(255.0)
+        np.round(vals, out=vals)
+        np.clip(vals, 0.0, 255.0, out=vals)
+        out[:, ch] = vals.astype(np.uint8)
+    return out
+
+
+@functools.lru_cache(maxsize=4096)
+def gradient_lut_for_palette(
+    left_hsv: Tuple[float, float, float],
+    right_hsv: Tuple[float, float, float],
+) -> np.ndarray:
+    t = np.linspace(0.0, 1.0, GRADIENT_LUT_SIZE, dtype=np.float32)
+    left = np.asarray(left_hsv, dtype=np.float32)
+    right = np.asarray(right_hsv, dtype=np.float32)
+    return hsv_to_rgb_np(lerp_hsv(left, right, t))
 
-    r[conds[0]], g[conds[0]], b[conds[0]] = c[conds[0]], x[conds[0]], 0
-    r[conds[1]], g[conds[1]], b[conds[1]] = x[conds[1]], c[conds[1]], 0
-    r[conds[2]], g[conds[2]], b[conds[2]] = 0, c[conds[2]], x[conds[2]]
-    r[conds[3]], g[conds[3]], b[conds[3]] = 0, x[conds[3]], c[conds[3]]
-    r[conds[4]], g[conds[4]], b[conds[4]] = x[conds[4]], 0, c[conds[4]]
-    r[conds[5]], g[conds[5]], b[conds[5]] = c[conds[5]], 0, x[conds[5]]
 
-    rgb = np.column_stack((r + m, g + m, b + m))
-    rgb = np.clip(np.round(rgb * 255.0), 0, 255).astype(np.uint8)
-    return rgb
+@functools.lru_cache(maxsize=4096)
+def gradient_lut_for_island(island_id: Union[int, str]) -> np.ndarray:
+    # Keyed by palette, not island id: islands whose hashes land on the same
+    # jittered palette share one table object.
+    left_hsv, right_hsv = palette_for_island(island_id)
+    return gradient_lut_for_palette(tuple(left_hsv.tolist()), tuple(right_hsv.tolist()))
 
 
 def normalize_pixels(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
@@ -269,30 +341,98 @@ def normalize_pixels(pixels: np.ndarray, width: int, height: int) -> np.ndarray:
     if p.size == 0:
         return np.empty((0, 2), dtype=np.int32)
 
-    p = np.unique(p.astype(np.int32), axis=0)
-    return p
+    # Pack (x, y) into one uint64 per pixel so np.unique takes its fast 1-D
+    # path instead of the structured row sort; both coordinates are
+    # non-negative here, and the key order matches the old lexicographic
+    # (x, y) row order.
+    packed = p.astype(np.uint64)
+    keys = np.unique((packed[:, 0] << np.uint64(32)) | packed[:, 1])
 
+    out = np.empty((keys.size, 2), dtype=np.int32)
+    out[:, 0] = (keys >> np.uint64(32)).astype(np.int32)
+    out[:, 1] = (keys & np.uint64(0xFFFFFFFF)).astype(np.int32)
+    return out
 
-def render_island_gradients(
+
+def compute_batched_local_t(
+    uvs: np.ndarray,
+    offsets: np.ndarray,
+    island_index: np.ndarray,
+    axes: np.ndarray,
+    centers: np.ndarray,
+    has_axis: np.ndarray,
+    eps: float = EPS,
+) -> np.ndarray:
+    """Segmented equivalent of compute_local_t over concatenated island pixels.
+
+    uvs is the (total_N, 2) concatenation of per-island pixel UVs, offsets the
+    per-island segment starts, island_index the per-pixel island index, and
+    axes/centers/has_axis per-island SoA arrays from compute_principal_axis.
+    """
+    # Same fused projection as compute_local_t, gathered per pixel.
+    center_dot = np.einsum("ij,ij->i", centers, axes)
+    t_raw = uvs[:, 0] * axes[island_index, 0] + uvs[:, 1] * axes[island_index, 1]
+    t_raw -= center_dot[island_index]
+
+    t_min = np.minimum.reduceat(t_raw, offsets)
+    t_max = np.maximum.reduceat(t_raw, offsets)
+    span = t_max - t_min
+    axis_ok = has_axis & np.isfinite(span) & (span >= eps)
+
+    safe_span = np.where(span >= eps, span, 1.0)
+    np.subtract(t_raw, t_min[island_index], out=t_raw)
+    np.divide(t_raw, safe_span[island_index], out=t_raw)
+    t = t_raw
+
+    # Bounding-box fallback for islands without a usable principal axis.
+    if not np.all(axis_ok):
+        u_min = np.minimum.reduceat(uvs[:, 0], offsets)
+        u_max = np.maximum.reduceat(uvs[:, 0], offsets)
+        v_min = np.minimum.reduceat(uvs[:, 1], offsets)
+        v_max = np.maximum.reduceat(uvs[:, 1], offsets)
+        span_u = u_max - u_min
+        span_v = v_max - v_min
+
+        use_u = span_u >= span_v
+        fb_min = np.where(use_u, u_min, v_min)
+        fb_span = np.maximum(eps, np.where(use_u, span_u, span_v))
+        coord = np.where(use_u[island_index], uvs[:, 0], uvs[:, 1])
+        t_fallback = (coord - fb_min[island_index]) / fb_span[island_index]
+
+        degenerate = (span_u < eps) & (span_v < eps)
+        t_fallback = np.where(degenerate[island_index], 0.5, t_fallback)
+        t = np.where(axis_ok[island_index], t, t_fallback)
+
+    return clamp01_array(t)
+
+
+def render_islands_rgb(
     width: int,
     height: int,
     islands: Sequence[IslandData],
-    transparent_background: bool = True,
-) -> np.ndarray:
-    out = np.zeros((height, width, 4), dtype=np.uint8)
-    if not transparent_background:
-        out[..., 3] = 255
+) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+    """Resolve islands to (pixels, rgba) arrays without touching a framebuffer."""
+    # Per-island scalars go into SoA arrays; per-pixel data is concatenated so
+    # the heavy work (t map, gradient lookup, scatter) runs as one batch
+    # instead of one small NumPy dispatch per island.
+    pixel_chunks: List[np.ndarray] = []
+    uv_chunks: List[np.ndarray] = []
+    axes_list: List[np.ndarray] = []
+    centers_list: List[np.ndarray] = []
+    has_axis_list: List[bool] = []
+    # Islands sharing a palette share a LUT object; stack each table once and
+    # point islands at slots instead of duplicating 256x3 blocks.
+    lut_slot_list: List[int] = []
+    lut_table: List[np.ndarray] = []
+    slot_by_lut: Dict[int, int] = {}
 
     for island in islands:
         pixels = island.pixels
         if pixels is None or pixels.size == 0:
             continue
 
-        x = pixels[:, 0]
-        y = pixels[:, 1]
-
         if island.pixel_uvs is not None and island.pixel_uvs.shape[0] == pixels.shape[0]:
-            pixel_uvs = island.pixel_uvs.astype(np.float64)
+            pixel_uvs = island.pixel_uvs.astype(np.float32)
         else:
             pixel_uvs = infer_uvs_from_pixels(pixels, width, height)
 
@@ -300,15 +440,96 @@ def render_island_gradients(
         if axis_source is None or axis_source.size == 0:
             axis_source = pixel_uvs
         else:
-            axis_source = axis_source.astype(np.float64)
+            axis_source = axis_source.astype(np.float32)
+
+        axis = compute_principal_axis(axis_source, eps=EPS)
+        if axis is None:
+            axes_list.append(np.zeros(2, dtype=np.float32))
+            has_axis_list.append(False)
+        else:
+            axes_list.append(axis.astype(np.float32))
+            has_axis_list.append(True)
+        centers_list.append(np.mean(axis_source, axis=0, dtype=np.float32))
+
+        lut = gradient_lut_for_island(island.island_id)
+        slot = slot_by_lut.get(id(lut))
+        if slot is None:
+            slot = len(lut_table)
+            slot_by_lut[id(lut)] = slot
+            lut_table.append(lut)
+        lut_slot_list.append(slot)
+
+        pixel_chunks.append(pixels)
+        uv_chunks.append(pixel_uvs)
+
+    if not pixel_chunks:
+        return None
+
+    counts = np.array([chunk.shape[0] for chunk in pixel_chunks], dtype=np.int64)
+    offsets = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    island_index = np.repeat(np.arange(counts.size), counts)
 
-        t = compute_local_t(pixel_uvs, axis_source, eps=EPS)
-        left_hsv, right_hsv = palette_for_island(island.island_id)
-        hsv = lerp_hsv(left_hsv, right_hsv, t)
-        rgb = hsv_to_rgb_np(hsv)
+    all_pixels = np.concatenate(pixel_chunks)
+    all_uvs = np.concatenate(uv_chunks)
+    axes = np.stack(axes_list)
+    centers = np.stack(centers_list)
+    has_axis = np.array(has_axis_list)
+    luts = np.stack(lut_table)
+    lut_slots = np.asarray(lut_slot_list, dtype=np.intp)
 
-        out[y, x, 0:3] = rgb
-        out[y, x, 3] = 255
+    t = compute_batched_local_t(all_uvs, offsets, island_index, axes, centers, has_axis, eps=EPS)
+    # The per-pixel color pass is a table lookup: each island's gradient was
+    # resolved once into a GRADIENT_LUT_SIZE-entry RGB table.
+    np.multiply(t, np.float32(GRADIENT_LUT_SIZE - 1), out=t)
+    np.round(t, out=t)
+    lut_index = t.astype(np.intp)
+    lut_index += lut_slots[island_index] * GRADIENT_LUT_SIZE
+
+    # Gather straight into a preallocated RGBA buffer (alpha included) so the
+    # framebuffer update is a single scatter with no intermediate RGB array.
+    rgba = np.empty((lut_index.size, 4), dtype=np.uint8)
+    rgba[:, 3] = 255
+    np.take(luts.reshape(-1, 3), lut_index, axis=0, out=rgba[:, :3])
+
+    return all_pixels, rgba
+
+
+def render_island_gradients(
+    width: int,
+    height: int,
+    islands: Sequence[IslandData],
+    transparent_background: bool = True,
+    max_workers: Optional[int] = None,
+) -> np.ndarray:
+    out = np.zeros((height, width, 4), dtype=np.uint8)
+    if not transparent_background:
+        out[..., 3] = 255
+
+    islands = [
+        island for island in islands if island.pixels is not None and island.pixels.size > 0
+    ]
+    if not islands:
+        return out
+
+    # Islands paint disjoint pixels, so groups of them can be resolved on
+    # worker threads (the heavy NumPy passes release the GIL); the scatter
+    # into the shared framebuffer stays on the calling thread.
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    group_count = min(max_workers, max(1, len(islands) // PARALLEL_MIN_ISLANDS_PER_GROUP))
+
+    if group_count > 1:
+        groups = [list(group) for group in np.array_split(np.asarray(islands, dtype=object), group_count)]
+        with ThreadPoolExecutor(max_workers=group_count) as pool:
+            results = list(pool.map(lambda group: render_islands_rgb(width, height, group), groups))
+    else:
+        results = [render_islands_rgb(width, height, islands)]
+
+    for result in results:
+        if result is None:
+            continue
+        pixels, rgba = result
+        out[pixels[:, 1], pixels[:, 0]] = rgba
 
     return out
 
@@ -318,37 +539,99 @@ def load_id_map(path: Path) -> np.ndarray:
     arr = np.asarray(image)
 
     if arr.ndim == 2:
-        return arr.astype(np.int64)
+        return arr
 
     if arr.ndim == 3:
         channels = arr.shape[2]
         if channels >= 3:
-            rgb = arr[..., :3].astype(np.int64)
-            ids = (rgb[..., 0] << 16) | (rgb[..., 1] << 8) | rgb[..., 2]
+            # uint32 is plenty for a 24-bit packed id and halves the map's
+            # footprint versus int64.
+            rgb = arr[..., :3].astype(np.uint32)
+            ids = (rgb[..., 0] << np.uint32(16)) | (rgb[..., 1] << np.uint32(8)) | rgb[..., 2]
             if channels >= 4:
-                alpha = arr[..., 3]
-                ids = ids.copy()
-                ids[alpha == 0] = 0
+                # The bit-ops above already allocated a fresh array; mask it
+                # in place without the defensive copy.
+                ids[arr[..., 3] == 0] = 0
             return ids
 
     raise ValueError(f"Unsupported ID map shape: {arr.shape}")
 
 
-def islands_from_id_map(ids: np.ndarray, background_id: int = 0) -> Tuple[List[IslandData], int, int]:
+def _split_island_components(island_id: int, pixels: np.ndarray) -> List[IslandData]:
+    """Split one island's pixels into 4-connected blobs via scipy.ndimage.label.
+
+    Labeling runs on a mask cropped to the island's bounding box, so the cost
+    scales with the island, not the full map.  Blobs get ids "<id>:<k>" so
+    each one draws its own palette and gradient axis.
+    """
+    x0 = int(pixels[:, 0].min())
+    y0 = int(pixels[:, 1].min())
+    local_x = pixels[:, 0] - x0
+    local_y = pixels[:, 1] - y0
+    mask = np.zeros((int(local_y.max()) + 1, int(local_x.max()) + 1), dtype=bool)
+    mask[local_y, local_x] = True
+
+    labels, count = ndimage.label(mask)
+    if count <= 1:
+        return [IslandData(island_id=island_id, pixels=pixels)]
+
+    blob_of_pixel = labels[local_y, local_x]
+    order = np.argsort(blob_of_pixel, kind="stable")
+    sorted_blobs = blob_of_pixel[order]
+    sorted_pixels = pixels[order]
+    boundaries = np.concatenate(
+        ([0], np.flatnonzero(np.diff(sorted_blobs)) + 1, [sorted_blobs.size])
+    )
+    return [
+        IslandData(
+            island_id=f"{island_id}:{int(sorted_blobs[start])}",
+            pixels=sorted_pixels[start:end],
+        )
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+    ]
+
+
+def islands_from_id_map(
+    ids: np.ndarray, background_id: int = 0, split_components: bool = False
+) -> Tuple[List[IslandData], int, int]:
     if ids.ndim != 2:
         raise ValueError("ID map must be 2D after decoding.")
 
+    if split_components and ndimage is None:
+        raise ValueError("Splitting id-map islands into components requires scipy.")
+
     height, width = ids.shape
-    unique_ids = np.unique(ids)
-    unique_ids = unique_ids[unique_ids != background_id]
+
+    # Bucket every foreground pixel by id in one pass (stable argsort of the
+    # flat indices) instead of scanning the whole map once per island.
+    flat = ids.ravel()
+    nz = np.flatnonzero(flat != background_id)
 
     islands: List[IslandData] = []
-    for island_id in sorted(unique_ids.tolist()):
-        ys, xs = np.where(ids == island_id)
-        if xs.size == 0:
-            continue
-        pixels = np.column_stack((xs, ys)).astype(np.int32)
-        islands.append(IslandData(island_id=island_id, pixels=pixels))
+    if nz.size == 0:
+        return islands, width, height
+
+    ids_nz = flat[nz]
+    order = np.argsort(ids_nz, kind="stable")
+    sorted_ids = ids_nz[order]
+    sorted_pos = nz[order]
+
+    # All pixels live in one (total_N, 2) int32 buffer; each island gets a
+    # contiguous slice view of it.
+    pixels_all = np.empty((sorted_pos.size, 2), dtype=np.int32)
+    ys, xs = np.divmod(sorted_pos, width)
+    pixels_all[:, 0] = xs
+    pixels_all[:, 1] = ys
+
+    boundaries = np.concatenate(
+        ([0], np.flatnonzero(np.diff(sorted_ids)) + 1, [sorted_ids.size])
+    )
+    for start, end in zip(boundaries[:-1], boundaries[1:]):
+        island_id = int(sorted_ids[start])
+        if split_components:
+            islands.extend(_split_island_components(island_id, pixels_all[start:end]))
+        else:
+            islands.append(IslandData(island_id=island_id, pixels=pixels_all[start:end]))
 
     return islands, width, height
 
@@ -446,88 +729,290 @@ def islands_from_explicit_payload(payload: Dict[str, Any], base_dir: Path) -> Tu
     return islands, width, height
 
 
-def connected_components_from_faces(faces: np.ndarray) -> List[List[int]]:
-    triangles_by_vertex: Dict[int, List[int]] = {}
-    for tri_idx, face in enumerate(faces):
-        for vertex in face:
-            key = int(vertex)
-            triangles_by_vertex.setdefault(key, []).append(tri_idx)
+def _label_components(vert_rows: np.ndarray, starts: np.ndarray, sorted_tris: np.ndarray) -> np.ndarray:
+    # Iterative DFS with a preallocated int32 stack: no Python list traffic,
+    # and the whole function jits to a native loop when numba is available.
+    tri_count = vert_rows.shape[0]
+    labels = np.full(tri_count, -1, dtype=np.int64)
+    stack = np.empty(tri_count, dtype=np.int32)
+    label = 0
 
-    visited = np.zeros(faces.shape[0], dtype=np.uint8)
-    components: List[List[int]] = []
-
-    for start in range(faces.shape[0]):
-        if visited[start]:
+    for start in range(tri_count):
+        if labels[start] >= 0:
             continue
 
-        stack = [start]
-        visited[start] = 1
-        comp: List[int] = []
+        sp = 0
+        stack[sp] = start
+        sp += 1
+        labels[start] = label
 
-        while stack:
-            tri_idx = stack.pop()
-            comp.append(tri_idx)
-            for vertex in faces[tri_idx]:
-                for nbr in triangles_by_vertex.get(int(vertex), []):
-                    if visited[nbr]:
-                        continue
-                    visited[nbr] = 1
-                    stack.append(nbr)
+        while sp > 0:
+            sp -= 1
+            tri_idx = stack[sp]
+            for k in range(3):
+                row = vert_rows[tri_idx, k]
+                for j in range(starts[row], starts[row + 1]):
+                    nbr = sorted_tris[j]
+                    if labels[nbr] < 0:
+                        labels[nbr] = label
+                        stack[sp] = nbr
+                        sp += 1
 
-        if comp:
-            components.append(comp)
+        label += 1
 
-    return components
+    return labels
 
 
-def quantized_uv_key(u: float, v: float, quant: float = 1e-6) -> Tuple[int, int]:
-    return (int(round(float(u) / quant)), int(round(float(v) / quant)))
+if njit is not None:
+    _label_components = njit(cache=True)(_label_components)
 
 
-def connected_components_from_raw_triangles(triangles_uv: np.ndarray) -> List[List[int]]:
-    triangles_by_uv: Dict[Tuple[int, int], List[int]] = {}
-    for tri_idx in range(triangles_uv.shape[0]):
-        tri = triangles_uv[tri_idx]
-        for p in tri:
-            key = quantized_uv_key(float(p[0]), float(p[1]))
-            triangles_by_uv.setdefault(key, []).append(tri_idx)
+def group_components_by_label(labels: np.ndarray) -> List[List[int]]:
+    order = np.argsort(labels, kind="stable")
+    sorted_labels = labels[order]
+    boundaries = np.concatenate(
+        ([0], np.flatnonzero(np.diff(sorted_labels)) + 1, [sorted_labels.size])
+    )
+    return [order[start:end].tolist() for start, end in zip(boundaries[:-1], boundaries[1:])]
 
-    visited = np.zeros(triangles_uv.shape[0], dtype=np.uint8)
-    components: List[List[int]] = []
 
-    for start in range(triangles_uv.shape[0]):
-        if visited[start]:
-            continue
+def connected_components_from_faces(faces: np.ndarray) -> List[List[int]]:
+    if faces.shape[0] == 0:
+        return []
+
+    if sparse is not None:
+        # Vertex->triangle incidence in CSR; V.T @ V links triangles sharing a
+        # vertex, then one C-implemented BFS labels all components.
+        tri_count = faces.shape[0]
+        rows = np.repeat(np.arange(tri_count, dtype=np.int64), 3)
+        cols = faces.ravel().astype(np.int64)
+        incidence = sparse.csr_matrix(
+            (np.ones(cols.size, dtype=np.int8), (cols, rows)),
+            shape=(int(cols.max()) + 1, tri_count),
+        )
+        adjacency = incidence.T @ incidence
+        _count, labels = csgraph_connected_components(adjacency, directed=False)
+        return group_components_by_label(labels)
+
+    # Fallback: CSR-style vertex->triangle adjacency built with one argsort.
+    # Triangles incident to a vertex form a contiguous slice of sorted_tris,
+    # replacing the old dict-of-lists and its per-corner hashing.
+    tri_count = faces.shape[0]
+    cols = faces.ravel().astype(np.int64)
+    order = np.argsort(cols, kind="stable")
+    sorted_verts = cols[order]
+    sorted_tris = (np.repeat(np.arange(tri_count, dtype=np.int64), 3))[order]
+    starts = np.concatenate(
+        ([0], np.flatnonzero(np.diff(sorted_verts)) + 1, [sorted_verts.size])
+    )
+    unique_verts = sorted_verts[starts[:-1]]
+    # Compact row index per face corner, so the DFS looks up slices directly.
+    vert_rows = np.ascontiguousarray(np.searchsorted(unique_verts, faces))
+
+    labels = _label_components(vert_rows, starts, sorted_tris)
+    return group_components_by_label(labels)
 
-        stack = [start]
-        visited[start] = 1
-        comp: List[int] = []
 
-        while stack:
-            tri_idx = stack.pop()
-            comp.append(tri_idx)
-            tri = triangles_uv[tri_idx]
-            for p in tri:
-                key = quantized_uv_key(float(p[0]), float(p[1]))
-                for nbr in triangles_by_uv.get(key, []):
-                    if visited[nbr]:
-                        continue
-                    visited[nbr] = 1
-                    stack.append(nbr)
+def connected_components_from_raw_triangles(
+    triangles_uv: np.ndarray, quant: float = 1e-6
+) -> List[List[int]]:
+    if triangles_uv.shape[0] == 0:
+        return []
 
-        if comp:
-            components.append(comp)
+    # Quantize all 3T corners at once, pack each (u, v) into a uint64 key and
+    # let np.unique assign canonical vertex ids. Quantized UV magnitudes stay
+    # far below the 32-bit range, so the packing is collision-free.
+    q = np.round(triangles_uv.reshape(-1, 2) / quant).astype(np.int64)
+    keys = (q[:, 0].astype(np.uint64) << np.uint64(32)) | q[:, 1].astype(
+        np.uint32
+    ).astype(np.uint64)
+    _unique_keys, vertex_ids = np.unique(keys, return_inverse=True)
 
-    return components
+    return connected_components_from_faces(vertex_ids.reshape(-1, 3))
 
 
 def uv_to_px(uv: np.ndarray, width: int, height: int) -> np.ndarray:
-    px = np.empty_like(uv, dtype=np.float64)
+    px = np.empty_like(uv, dtype=np.float32)
     px[:, 0] = np.clip(uv[:, 0], 0.0, 1.0) * max(1, width - 1)
     px[:, 1] = (1.0 - np.clip(uv[:, 1], 0.0, 1.0)) * max(1, height - 1)
     return px
 
 
+def _raster_tri(
+    id_map: np.ndarray,
+    x0: float,
+    y0: float,
+    x1: float,
+    y1: float,
+    x2: float,
+    y2: float,
+    min_x: int,
+    max_x: int,
+    min_y: int,
+    max_y: int,
+    island_id: int,
+    background_id: int,
+) -> None:
+    # Incremental edge functions in Q16.16 fixed point. Orientation flipping
+    # makes all three edge values non-negative for inside pixels, so the inner
+    # loop ORs the three ints and tests a single sign bit (SWAR) before the
+    # background check.
+    x0q = int(round(x0 * 65536.0))
+    y0q = int(round(y0 * 65536.0))
+    x1q = int(round(x1 * 65536.0))
+    y1q = int(round(y1 * 65536.0))
+    x2q = int(round(x2 * 65536.0))
+    y2q = int(round(y2 * 65536.0))
+
+    a0 = y1q - y2q
+    b0 = x2q - x1q
+    a1 = y2q - y0q
+    b1 = x0q - x2q
+
+    den_q = a0 * (x0q - x2q) + b0 * (y0q - y2q)
+    if den_q == 0:
+        return
+    if den_q < 0:
+        a0 = -a0
+        b0 = -b0
+        a1 = -a1
+        b1 = -b1
+        den_q = -den_q
+
+    # Matches the old -1e-6 tolerance on normalized barycentrics.
+    eps_q = den_q // 1000000
+
+    pxq = min_x << 16
+    pyq = min_y << 16
+    w0_row = a0 * (pxq - x2q) + b0 * (pyq - y2q) + eps_q
+    w1_row = a1 * (pxq - x2q) + b1 * (pyq - y2q) + eps_q
+    w2_row = den_q - w0_row - w1_row + 3 * eps_q
+
+    dw0_dx = a0 << 16
+    dw0_dy = b0 << 16
+    dw1_dx = a1 << 16
+    dw1_dy = b1 << 16
+    dw2_dx = -dw0_dx - dw1_dx
+    dw2_dy = -dw0_dy - dw1_dy
+
+    for y in range(min_y, max_y + 1):
+        w0 = w0_row
+        w1 = w1_row
+        w2 = w2_row
+        for x in range(min_x, max_x + 1):
+            if (w0 | w1 | w2) >= 0 and id_map[y, x] == background_id:
+                id_map[y, x] = island_id
+            w0 += dw0_dx
+            w1 += dw1_dx
+            w2 += dw2_dx
+        w0_row += dw0_dy
+        w1_row += dw1_dy
+        w2_row += dw2_dy
+
+
+if njit is not None:
+    _raster_tri = njit(cache=True, fastmath=True)(_raster_tri)
+
+
+def _raster_tri_numpy(
+    id_map: np.ndarray,
+    x0: float,
+    y0: float,
+    x1: float,
+    y1: float,
+    x2: float,
+    y2: float,
+    min_x: int,
+    max_x: int,
+    min_y: int,
+    max_y: int,
+    island_id: int,
+    background_id: int,
+) -> None:
+    # Vectorized fallback when numba is unavailable; same Q16.16 edge
+    # functions, with the three sign bits combined through one OR.
+    x0q = int(round(x0 * 65536.0))
+    y0q = int(round(y0 * 65536.0))
+    x1q = int(round(x1 * 65536.0))
+    y1q = int(round(y1 * 65536.0))
+    x2q = int(round(x2 * 65536.0))
+    y2q = int(round(y2 * 65536.0))
+
+    a0 = y1q - y2q
+    b0 = x2q - x1q
+    a1 = y2q - y0q
+    b1 = x0q - x2q
+
+    den_q = a0 * (x0q - x2q) + b0 * (y0q - y2q)
+    if den_q == 0:
+        return
+    if den_q < 0:
+        a0, b0, a1, b1 = -a0, -b0, -a1, -b1
+        den_q = -den_q
+
+    eps_q = den_q // 1000000
+
+    # Broadcast the 1-D coordinate deltas instead of materializing meshgrid
+    # planes; the (rows, cols) shape only appears in the w arrays themselves.
+    dx = ((np.arange(min_x, max_x + 1, dtype=np.int64) << 16) - x2q)[np.newaxis, :]
+    dy = ((np.arange(min_y, max_y + 1, dtype=np.int64) << 16) - y2q)[:, np.newaxis]
+
+    w0 = a0 * dx + b0 * dy + eps_q
+    w1 = a1 * dx + b1 * dy + eps_q
+    w2 = den_q - w0 - w1 + 3 * eps_q
+
+    mask = (w0 | w1 | w2) >= 0
+    if not np.any(mask):
+        return
+
+    sub = id_map[min_y : max_y + 1, min_x : max_x + 1]
+    sub[mask & (sub == background_id)] = island_id
+
+
+def _raster_component(tris_px: np.ndarray, id_map: np.ndarray, island_id: int, background_id: int) -> None:
+    # One call walks every triangle of a component; the benign write race under
+    # prange is safe because all triangles store the same island_id and only
+    # into background pixels.
+    height, width = id_map.shape
+    for t in prange(tris_px.shape[0]):
+        x0 = float(tris_px[t, 0, 0])
+        y0 = float(tris_px[t, 0, 1])
+        x1 = float(tris_px[t, 1, 0])
+        y1 = float(tris_px[t, 1, 1])
+        x2 = float(tris_px[t, 2, 0])
+        y2 = float(tris_px[t, 2, 1])
+
+        min_x = max(0, int(math.floor(min(x0, x1, x2))))
+        max_x = min(width - 1, int(math.ceil(max(x0, x1, x2))))
+        min_y = max(0, int(math.floor(min(y0, y1, y2))))
+        max_y = min(height - 1, int(math.ceil(max(y0, y1, y2))))
+        if min_x > max_x or min_y > max_y:
+            continue
+
+        den = (y1 - y2) * (x0 - x2) + (x2 - x1) * (y0 - y2)
+        if abs(den) < 1e-12:
+            continue
+
+        _raster_tri(
+            id_map, x0, y0, x1, y1, x2, y2,
+            min_x, max_x, min_y, max_y,
+            island_id, background_id,
+        )
+
+
+if njit is not None:
+    _raster_component = njit(cache=True, parallel=True, fastmath=True)(_raster_component)
+
+
+def rasterize_component_into_map(id_map: np.ndarray, tris_px: np.ndarray, island_id: int, background_id: int) -> None:
+    if njit is not None:
+        _raster_component(np.ascontiguousarray(tris_px), id_map, island_id, background_id)
+        return
+
+    for tri_px in tris_px:
+        rasterize_triangle_into_map(id_map, tri_px, island_id=island_id, background_id=background_id)
+
+
 def rasterize_triangle_into_map(id_map: np.ndarray, tri_px: np.ndarray, island_id: int, background_id: int) -> None:
     x0, y0 = tri_px[0]
     x1, y1 = tri_px[1]
@@ -545,22 +1030,22 @@ def rasterize_triangle_into_map(id_map: np.ndarray, tri_px: np.ndarray, island_i
     if abs(den) < 1e-12:
         return
 
-    xs = np.arange(min_x, max_x + 1, dtype=np.float64)
-    ys = np.arange(min_y, max_y + 1, dtype=np.float64)
-    gx, gy = np.meshgrid(xs, ys)
-
-    w0 = ((y1 - y2) * (gx - x2) + (x2 - x1) * (gy - y2)) / den
-    w1 = ((y2 - y0) * (gx - x2) + (x0 - x2) * (gy - y2)) / den
-    w2 = 1.0 - w0 - w1
-
-    mask = (w0 >= -1e-6) & (w1 >= -1e-6) & (w2 >= -1e-6)
-    if not np.any(mask):
-        return
-
-    sub = id_map[min_y : max_y + 1, min_x : max_x + 1]
-    paint_mask = mask & (sub == background_id)
-    sub[paint_mask] = island_id
-    id_map[min_y : max_y + 1, min_x : max_x + 1] = sub
+    kernel = _raster_tri if njit is not None else _raster_tri_numpy
+    kernel(
+        id_map,
+        float(x0),
+        float(y0),
+        float(x1),
+        float(y1),
+        float(x2),
+        float(y2),
+        min_x,
+        max_x,
+        min_y,
+        max_y,
+        island_id,
+        background_id,
+    )
 
 
 def islands_from_mesh_payload(payload: Dict[str, Any]) -> Tuple[List[IslandData], int, int]:
@@ -596,7 +1081,19 @@ def islands_from_mesh_payload(payload: Dict[str, Any]) -> Tuple[List[IslandData]
     else:
         raise ValueError("Mesh payload needs either (uv_vertices + faces) or triangles.")
 
-    id_map = np.full((height, width), background_id, dtype=np.int64)
+    # Island ids are assigned sequentially from 1 (skipping background_id), so
+    # the largest value the map must hold is known up front; a narrow dtype
+    # halves or quarters rasterizer memory traffic on big maps.
+    max_id_value = max(len(components) + 1, background_id)
+    if background_id < 0:
+        id_dtype = np.int64
+    elif max_id_value < 2**8:
+        id_dtype = np.uint8
+    elif max_id_value < 2**16:
+        id_dtype = np.uint16
+    else:
+        id_dtype = np.uint32
+    id_map = np.full((height, width), background_id, dtype=id_dtype)
     islands: List[IslandData] = []
 
     next_island_id = 1
@@ -609,9 +1106,8 @@ def islands_from_mesh_payload(payload: Dict[str, Any]) -> Tuple[List[IslandData]
         island_id = next_island_id
         next_island_id += 1
 
-        for tri_uv in comp_tris:
-            tri_px = uv_to_px(tri_uv, width, height)
-            rasterize_triangle_into_map(id_map, tri_px, island_id=island_id, background_id=background_id)
+        tris_px = uv_to_px(comp_tris.reshape(-1, 2), width, height).reshape(-1, 3, 2)
+        rasterize_component_into_map(id_map, tris_px, island_id=island_id, background_id=background_id)
 
         ys, xs = np.where(id_map == island_id)
         if xs.size == 0:
@@ -647,6 +1143,7 @@ def load_islands(
     payload_base_dir: Path,
     cli_id_map: Optional[Path],
     background_id_override: Optional[int],
+    split_components: bool = False,
 ) -> Tuple[List[IslandData], int, int]:
     background_id = int(
         background_id_override
@@ -660,7 +1157,9 @@ def load_islands(
 
     if id_map_path is not None:
         ids = load_id_map(id_map_path)
-        return islands_from_id_map(ids, background_id=background_id)
+        return islands_from_id_map(
+            ids, background_id=background_id, split_components=split_components
+        )
 
     if isinstance(payload.get("islands"), list):
         return islands_from_explicit_payload(payload, payload_base_dir)
@@ -699,11 +1198,22 @@ def parse_args() -> argparse.Namespace:
         default=None,
         help="Background ID value in ID maps (default 0).",
     )
+    parser.add_argument(
+        "--split-components",
+        action="store_true",
+        help="Treat disconnected regions sharing one ID as separate islands (requires scipy).",
+    )
     parser.add_argument(
         "--opaque-bg",
         action="store_true",
         help="Write opaque black background instead of transparent.",
     )
+    parser.add_argument(
+        "--png-compress-level",
+        type=int,
+        default=1,
+        help="zlib compression level for the output PNG (0-9, default 1 for speed).",
+    )
     return parser.parse_args()
 
 
@@ -725,6 +1235,7 @@ def main() -> None:
         payload_base_dir=payload_base_dir,
         cli_id_map=cli_id_map,
         background_id_override=args.background_id,
+        split_components=args.split_components,
     )
 
     rgba = render_island_gradients(
@@ -736,7 +1247,12 @@ def main() -> None:
 
     output_path = Path(args.output).resolve()
     output_path.parent.mkdir(parents=True, exist_ok=True)
-    Image.fromarray(rgba, mode="RGBA").save(output_path, format="PNG")
+    Image.fromarray(rgba, mode="RGBA").save(
+        output_path,
+        format="PNG",
+        optimize=False,
+        compress_level=clamp(args.png_compress_level, 0, 9),
+    )
 
     print(
         f"Saved {output_path} ({width}x{height}) with {len(islands)} islands, "